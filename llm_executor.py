@@ -1,18 +1,124 @@
 import openai
+import httpx
+import asyncio
+import functools
 import json
 import inspect
 import logging
-from typing import Dict, Any, Callable
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
 import utils
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# Prefer orjson for parsing tool-call arguments when it is installed
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# Tools whose result depends only on their arguments (no files or other side effects),
+# so repeated calls can be served from the result cache
+PURE_FUNCTIONS = frozenset({"calculate_average", "fibonacci", "text_statistics"})
+RESULT_CACHE_SIZE = 128
+
+SYSTEM_PROMPT = """You are a helpful AI assistant with access to various computational and visualization functions. 
+Your goal is to help users accomplish their tasks in the most natural way possible.
+When users ask questions or make requests, think about how you can use your available functions to provide meaningful responses.
+Don't just list what you can do - actively use your functions to demonstrate capabilities and provide value.
+You can use multiple functions if needed to accomplish a task.
+For example:
+- If someone asks about numbers, consider calculating averages or generating sequences
+- If they're interested in visuals, create plots or gradients
+- If they mention text, analyze its statistics
+Be creative and proactive in using your functions to help users, while maintaining a natural conversation."""
+
+BATCHED_PROMPT = """You are a helpful AI assistant. You will receive several independent questions numbered Q1, Q2, ...
+Answer each question separately and naturally.
+Reply with a JSON object of the form {"answers": [...]} containing exactly one answer string per question, in order.
+If a question needs computation, file access, or visualization tools to be answered properly, use null as its answer instead."""
+
+# Shared clients per event loop: an httpx pool is bound to the loop it first runs on,
+# so each loop gets its own HTTP connection pool and one OpenAI client per API key.
+# Pools should be closed with LLMExecutor.aclose() before their loop ends; entries left
+# behind by closed loops are evicted on the next lookup
+_LOOP_CLIENTS: Dict[asyncio.AbstractEventLoop, dict] = {}
+
+def _get_client(api_key: str) -> openai.AsyncOpenAI:
+    """Get the shared OpenAI client for an API key on the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    for stale_loop in [l for l in _LOOP_CLIENTS if l.is_closed()]:
+        # The pool can no longer be closed on its own loop; dropping it releases its sockets
+        logger.warning("Discarding HTTP connection pool of a closed event loop (call LLMExecutor.aclose() before the loop ends)")
+        del _LOOP_CLIENTS[stale_loop]
+    shared = _LOOP_CLIENTS.get(loop)
+    if shared is None:
+        # Persistent HTTP/2 connection pool reused by every executor and request on this loop
+        shared = _LOOP_CLIENTS[loop] = {
+            "http_client": httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                timeout=httpx.Timeout(60.0, connect=5.0)
+            ),
+            "clients": {}
+        }
+    clients = shared["clients"]
+    if api_key not in clients:
+        clients[api_key] = openai.AsyncOpenAI(api_key=api_key, http_client=shared["http_client"])
+    return clients[api_key]
+
+async def _close_clients() -> None:
+    """Close the shared HTTP connection pool of the running event loop"""
+    shared = _LOOP_CLIENTS.pop(asyncio.get_running_loop(), None)
+    if shared is not None:
+        await shared["http_client"].aclose()
+
+@functools.lru_cache(maxsize=1)
+def _get_available_functions() -> Dict[str, Callable]:
+    """Get all functions registered as tools in utils module (computed once per process)"""
+    logger.debug("Getting registered tools from utils module")
+    functions = utils.TOOL_REGISTRY.copy()
+    logger.debug("Found functions: %s", functions.keys())
+    return functions
+
+@functools.lru_cache(maxsize=1)
+def _generate_function_descriptions() -> list:
+    """Generate function descriptions for GPT-4 (computed once per process)"""
+    logger.debug("Generating function descriptions")
+    functions = []
+    for name, func in _get_available_functions().items():
+        logger.debug("Processing function: %s", name)
+        doc = inspect.getdoc(func)
+        sig = inspect.signature(func)
+
+        parameters = {}
+        for param_name, param in sig.parameters.items():
+            logger.debug("Processing parameter: %s for function %s", param_name, name)
+            if param.kind == param.VAR_POSITIONAL:
+                parameters[param_name] = {
+                    "type": "array",
+                    "items": {"type": "number"},
+                    "description": "Array of numbers"
+                }
+            else:
+                parameters[param_name] = {
+                    "type": "object",
+                    "description": f"Parameter {param_name}"
+                }
+
+        functions.append({
+            "name": name,
+            "description": doc,
+            "parameters": {
+                "type": "object",
+                "properties": parameters,
+                "required": [p.name for p in sig.parameters.values() if p.default == p.empty]
+            }
+        })
+    return functions
+
+
 class LLMExecutor:
     def __init__(self, api_key: str, max_iterations: int = 5):
         """
@@ -22,61 +128,32 @@ class LLMExecutor:
             max_iterations: Maximum number of function call iterations allowed (default: 5)
         """
         logger.info("Initializing LLMExecutor")
-        self.client = openai.OpenAI(api_key=api_key)
+        self._api_key = api_key
         self.max_iterations = max_iterations
         logger.info(f"Maximum iterations set to: {max_iterations}")
-        self.available_functions = self._get_available_functions()
+        self.available_functions = _get_available_functions()
         logger.info(f"Loaded {len(self.available_functions)} available functions")
-        self.function_descriptions = self._generate_function_descriptions()
+        self.function_descriptions = _generate_function_descriptions()
         logger.info("Function descriptions generated")
+        self._tools_payload = [{"type": "function", "function": f} for f in self.function_descriptions]
+        self._result_cache = OrderedDict()
 
-    def _get_available_functions(self) -> Dict[str, Callable]:
-        """Get all available functions from utils module"""
-        logger.debug("Getting available functions from utils module")
-        functions = {
-            name: func for name, func in inspect.getmembers(utils, inspect.isfunction)
-        }
-        logger.debug(f"Found functions: {list(functions.keys())}")
-        return functions
-
-    def _generate_function_descriptions(self) -> list:
-        """Generate function descriptions for GPT-4"""
-        logger.debug("Generating function descriptions")
-        functions = []
-        for name, func in self.available_functions.items():
-            logger.debug(f"Processing function: {name}")
-            doc = inspect.getdoc(func)
-            sig = inspect.signature(func)
-            
-            parameters = {}
-            for param_name, param in sig.parameters.items():
-                logger.debug(f"Processing parameter: {param_name} for function {name}")
-                if param.kind == param.VAR_POSITIONAL:
-                    parameters[param_name] = {
-                        "type": "array",
-                        "items": {"type": "number"},
-                        "description": "Array of numbers"
-                    }
-                else:
-                    parameters[param_name] = {
-                        "type": "object",
-                        "description": f"Parameter {param_name}"
-                    }
-
-            functions.append({
-                "name": name,
-                "description": doc,
-                "parameters": {
-                    "type": "object",
-                    "properties": parameters,
-                    "required": [p.name for p in sig.parameters.values() if p.default == p.empty]
-                }
-            })
-        return functions
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """OpenAI client shared by all executors on the running event loop"""
+        return _get_client(self._api_key)
+
+    async def aclose(self) -> None:
+        """
+        Close the HTTP connection pool of the running event loop.
+        The pool is shared, so this affects every executor on the loop; a later request opens a new one
+        """
+        await _close_clients()
 
-    def execute_function(self, function_name: str, **kwargs) -> Any:
+    async def execute_function(self, function_name: str, **kwargs) -> Any:
         """
-        Execute a function by name with given arguments
+        Execute a function by name with given arguments.
+        Coroutine functions are awaited; regular functions run in a worker thread
         Args:
             function_name: Name of the function to execute
             **kwargs: Arguments to pass to the function
@@ -84,58 +161,158 @@ class LLMExecutor:
             Any: Result of the function execution
         """
         logger.info(f"Executing function: {function_name}")
-        logger.debug(f"Function arguments: {kwargs}")
+        logger.debug("Function arguments: %s", kwargs)
         
         if function_name not in self.available_functions:
             logger.error(f"Function {function_name} not found in available functions")
             raise ValueError(f"Function {function_name} not found")
         
+        cache_key = None
+        if function_name in PURE_FUNCTIONS:
+            cache_key = (function_name, json.dumps(kwargs, sort_keys=True))
+            if cache_key in self._result_cache:
+                self._result_cache.move_to_end(cache_key)
+                logger.info(f"Function {function_name} served from cache")
+                return self._result_cache[cache_key]
+        
         function = self.available_functions[function_name]
         try:
-            result = function(**kwargs)
+            if inspect.iscoroutinefunction(function):
+                result = await function(**kwargs)
+            else:
+                result = await asyncio.to_thread(function, **kwargs)
             logger.info(f"Function {function_name} executed successfully")
-            logger.debug(f"Function result: {result}")
+            logger.debug("Function result: %s", result)
+            if cache_key is not None:
+                self._result_cache[cache_key] = result
+                if len(self._result_cache) > RESULT_CACHE_SIZE:
+                    self._result_cache.popitem(last=False)
             return result
         except Exception as e:
             logger.error(f"Error executing function {function_name}: {str(e)}")
             raise
 
-    def process_user_input(self, user_input: str) -> str:
+    async def _stream_completion(self, messages: list, on_token: Optional[Callable[[str], None]] = None, **kwargs) -> dict:
         """
-        Process user input and execute appropriate functions
+        Stream a chat completion, assembling content and tool calls from the deltas
         Args:
-            user_input: User's input text
+            messages: Conversation messages to send
+            on_token: Optional callback invoked with each content delta as it arrives
+            **kwargs: Extra arguments for chat.completions.create (e.g. tools)
         Returns:
-            str: Response from GPT-4 with function execution results
+            dict: Assistant message with "content" and "tool_calls" (list of tool call dicts)
         """
-        logger.info("Processing user input")
-        logger.debug(f"User input: {user_input}")
+        stream = await self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            stream=True,
+            **kwargs
+        )
+
+        content_parts = []
+        tool_calls = {}
+        finish_reason = None
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if delta.content:
+                content_parts.append(delta.content)
+                if on_token:
+                    on_token(delta.content)
+            for tc in delta.tool_calls or []:
+                entry = tool_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+                if tc.id:
+                    entry["id"] = tc.id
+                if tc.function and tc.function.name:
+                    entry["name"] += tc.function.name
+                if tc.function and tc.function.arguments:
+                    entry["arguments"] += tc.function.arguments
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+        logger.debug("Stream finished with reason: %s", finish_reason)
+        return {
+            "content": "".join(content_parts) or None,
+            "tool_calls": [
+                {
+                    "id": entry["id"],
+                    "type": "function",
+                    "function": {"name": entry["name"], "arguments": entry["arguments"]}
+                }
+                for _, entry in sorted(tool_calls.items())
+            ] if finish_reason == "tool_calls" else []
+        }
+
+    async def _execute_tool_calls(self, messages: list, message: dict) -> None:
+        """
+        Execute the tool calls of an assistant message and append them with their results to the conversation
+        Args:
+            messages: Conversation messages, extended in place
+            message: Assistant message with "content" and "tool_calls"
+        """
+        # Process all function calls
+        logger.info(f"Processing {len(message['tool_calls'])} function calls")
+        for tool_call in message["tool_calls"]:
+            logger.info(f"Assistant wants to call function: {tool_call['function']['name']}")
+            logger.debug("Function arguments: %s", tool_call['function']['arguments'])
+
+        # Execute the functions concurrently
+        results = await asyncio.gather(*(
+            self.execute_function(tool_call["function"]["name"], **_loads(tool_call["function"]["arguments"]))
+            for tool_call in message["tool_calls"]
+        ))
+        tool_results = list(zip(message["tool_calls"], results))
+
+        # Add all function calls and results to the conversation
+        messages.append({
+            "role": "assistant",
+            "content": message["content"],
+            "tool_calls": [tr[0] for tr in tool_results]
+        })
         
-        messages = [
-            {"role": "system", "content": """You are a helpful AI assistant with access to various computational and visualization functions. 
-Your goal is to help users accomplish their tasks in the most natural way possible.
-When users ask questions or make requests, think about how you can use your available functions to provide meaningful responses.
-Don't just list what you can do - actively use your functions to demonstrate capabilities and provide value.
-You can use multiple functions if needed to accomplish a task.
-For example:
-- If someone asks about numbers, consider calculating averages or generating sequences
-- If they're interested in visuals, create plots or gradients
-- If they mention text, analyze its statistics
-Be creative and proactive in using your functions to help users, while maintaining a natural conversation."""},
-            {"role": "user", "content": user_input}
-        ]
+        for tool_call, result in tool_results:
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "name": tool_call["function"]["name"],
+                "content": str(result)
+            })
+
+    async def _run_conversation(self, messages: list, on_token: Optional[Callable[[str], None]] = None, iteration_count: int = 0) -> str:
+        """
+        Run the function calling loop until the assistant answers without tool calls.
+        After max_iterations rounds of function calls, one last request without tools produces the answer
+        Args:
+            messages: Conversation messages, extended in place
+            on_token: Optional callback receiving response text as it is streamed
+            iteration_count: Number of iterations already used for this conversation (default: 0)
+        Returns:
+            str: Final response from GPT-4
+        """
+        # Text streamed alongside tool calls is separated from whatever the next round streams
+        separator_pending = False
+
+        def emit(token: str) -> None:
+            nonlocal separator_pending
+            if separator_pending:
+                on_token("\n\n")
+                separator_pending = False
+            on_token(token)
+
+        stream_handler = emit if on_token else None
 
-        iteration_count = 0
         while iteration_count < self.max_iterations:
             iteration_count += 1
             logger.info(f"Starting iteration {iteration_count}/{self.max_iterations}")
             
             logger.info("Sending request to OpenAI API")
             try:
-                response = self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    tools=[{"type": "function", "function": f} for f in self.function_descriptions],
+                message = await self._stream_completion(
+                    messages,
+                    stream_handler,
+                    tools=self._tools_payload,
                     tool_choice="auto"
                 )
                 logger.debug("Received response from OpenAI API")
@@ -143,62 +320,196 @@ Be creative and proactive in using your functions to help users, while maintaini
                 logger.error(f"Error calling OpenAI API: {str(e)}")
                 raise
 
-            message = response.choices[0].message
-            logger.debug(f"Assistant message: {message}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Assistant message: %s", message)
 
             # If no function calls, return the response
-            if not message.tool_calls:
+            if not message["tool_calls"]:
                 logger.info("No function calls needed, returning direct response")
-                return message.content
+                logger.debug("Final response: %s", message["content"])
+                return message["content"]
+
+            await self._execute_tool_calls(messages, message)
+            if message["content"]:
+                separator_pending = True
 
-            # Process all function calls
-            logger.info(f"Processing {len(message.tool_calls)} function calls")
-            tool_results = []
+            # The next iteration sends the tool results and picks up the follow-up response
+            logger.info("Continuing conversation with function results")
             
-            for tool_call in message.tool_calls:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-                
-                logger.info(f"Assistant wants to call function: {function_name}")
-                logger.debug(f"Function arguments: {function_args}")
-                
-                # Execute the function
-                result = self.execute_function(function_name, **function_args)
-                tool_results.append((tool_call, result))
-
-            # Add all function calls and results to the conversation
-            messages.append({
-                "role": "assistant",
-                "content": None,
-                "tool_calls": [tr[0] for tr in tool_results]
+        # If we've reached the maximum iterations, send the last function results without tools
+        # so the model has to answer with text
+        logger.warning(f"Reached maximum iterations ({self.max_iterations}), getting final response without functions")
+        try:
+            message = await self._stream_completion(messages, stream_handler)
+        except Exception as e:
+            logger.error(f"Error getting final response: {str(e)}")
+            raise
+
+        if message["content"]:
+            logger.debug("Final response: %s", message["content"])
+            return message["content"]
+
+        response_content = f"I've reached the maximum number of function calls ({self.max_iterations}) without a final answer."
+        if stream_handler:
+            stream_handler(response_content)
+        return response_content
+
+    async def process_user_input(self, user_input: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Process user input and execute appropriate functions
+        Args:
+            user_input: User's input text
+            on_token: Optional callback receiving response text as it is streamed
+        Returns:
+            str: Response from GPT-4 with function execution results
+        """
+        logger.info("Processing user input")
+        logger.debug("User input: %s", user_input)
+        
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_input}
+        ]
+        return await self._run_conversation(messages, on_token)
+
+    async def process_batch(self, user_inputs: list, poll_interval: float = 30.0) -> list:
+        """
+        Process many user inputs through the OpenAI Batch API (lower cost, completes within 24h).
+        Functions requested in the batch responses are executed locally and those
+        conversations are finished with regular requests
+        Args:
+            user_inputs: List of user input texts
+            poll_interval: Seconds to wait between batch status checks (default: 30.0)
+        Returns:
+            list: Responses in the same order as user_inputs (None for requests that failed)
+        """
+        logger.info(f"Submitting batch of {len(user_inputs)} user inputs")
+        conversations = [
+            [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_input}
+            ]
+            for user_input in user_inputs
+        ]
+        lines = [
+            json.dumps({
+                "custom_id": f"req-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": "gpt-4o-mini",
+                    "messages": messages,
+                    "tools": self._tools_payload,
+                    "tool_choice": "auto"
+                }
             })
-            
-            for tool_call, result in tool_results:
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "name": tool_call.function.name,
-                    "content": str(result)
-                })
-
-            # If this was the last round of function calls, get the final response
-            if not message.content:
-                logger.info("Getting final response from OpenAI")
+            for i, messages in enumerate(conversations)
+        ]
+
+        batch_file = await self.client.files.create(
+            file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"Created batch {batch.id}")
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            logger.debug("Batch %s status: %s", batch.id, batch.status)
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+
+        if batch.status != "completed":
+            logger.error(f"Batch {batch.id} ended with status: {batch.status}")
+            raise RuntimeError(f"Batch {batch.id} ended with status: {batch.status}")
+
+        # Collect the first assistant message of each request
+        first_messages = {}
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                record = _loads(line)
+                index = int(record["custom_id"].split("-", 1)[1])
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    logger.error(f"Batch request {record['custom_id']} failed: {record.get('error') or response}")
+                    continue
+                message = response["body"]["choices"][0]["message"]
+                first_messages[index] = {
+                    "content": message.get("content"),
+                    "tool_calls": message.get("tool_calls") or []
+                }
+
+        async def finish(index: int):
+            message = first_messages.get(index)
+            if message is None:
+                return None
+            if not message["tool_calls"]:
+                return message["content"]
+            # Functions run client-side, then the conversation continues interactively
+            messages = conversations[index]
+            try:
+                await self._execute_tool_calls(messages, message)
+                return await self._run_conversation(messages, iteration_count=1)
+            except Exception as e:
+                logger.error(f"Error finishing batch request req-{index}: {str(e)}")
+                return None
+
+        return list(await asyncio.gather(*(finish(i) for i in range(len(user_inputs)))))
+
+    async def process_user_inputs(self, user_inputs: list, batch_size: int = 10, max_concurrency: int = 4) -> list:
+        """
+        Process many independent user inputs by packing several into each request.
+        Inputs the model cannot answer without functions fall back to process_user_input
+        Args:
+            user_inputs: List of user input texts
+            batch_size: Number of inputs answered per request (default: 10)
+            max_concurrency: Maximum number of requests in flight at once (default: 4)
+        Returns:
+            list: Responses in the same order as user_inputs (None for inputs that failed)
+        """
+        logger.info(f"Processing {len(user_inputs)} user inputs in batches of {batch_size}")
+        # Bound in-flight requests so large input lists stay within rate limits
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer_single(user_input: str) -> Optional[str]:
+            async with semaphore:
                 try:
-                    final_response = self.client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=messages
-                    )
-                    response_content = final_response.choices[0].message.content
-                    logger.debug(f"Final response: {response_content}")
-                    return response_content
+                    return await self.process_user_input(user_input)
                 except Exception as e:
-                    logger.error(f"Error getting final response: {str(e)}")
-                    raise
-            
-            # If there's content, it means we should continue the conversation
-            logger.info("Continuing conversation with intermediate response")
-            
-        # If we've reached the maximum iterations
-        logger.warning(f"Reached maximum iterations ({self.max_iterations}), stopping conversation")
-        return f"I've reached the maximum number of function calls ({self.max_iterations}). Here's what I've done so far: {message.content}" 
\ No newline at end of file
+                    logger.error(f"Error processing user input individually: {str(e)}")
+                    return None
+
+        async def answer_batch(batch: list) -> list:
+            questions = "\n".join(f"Q{i}: {user_input}" for i, user_input in enumerate(batch, 1))
+            messages = [
+                {"role": "system", "content": BATCHED_PROMPT},
+                {"role": "user", "content": questions}
+            ]
+            try:
+                async with semaphore:
+                    message = await self._stream_completion(messages, response_format={"type": "json_object"})
+                answers = _loads(message["content"])["answers"]
+            except Exception as e:
+                logger.error(f"Error getting batched answers: {str(e)}")
+                answers = None
+
+            if not isinstance(answers, list) or len(answers) != len(batch):
+                logger.warning("Batched answers could not be used, falling back to individual requests")
+                answers = [None] * len(batch)
+
+            # Questions that need functions are handled with individual requests
+            fallback = [i for i, answer in enumerate(answers) if not isinstance(answer, str)]
+            fallback_responses = await asyncio.gather(*(answer_single(batch[i]) for i in fallback))
+            for i, response in zip(fallback, fallback_responses):
+                answers[i] = response
+            return answers
+
+        batches = [user_inputs[i:i + batch_size] for i in range(0, len(user_inputs), batch_size)]
+        results = await asyncio.gather(*(answer_batch(batch) for batch in batches))
+        return [response for batch_results in results for response in batch_results]
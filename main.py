@@ -1,7 +1,16 @@
 from llm_executor import LLMExecutor
+import asyncio
+import logging
 import os
 
-def main():
+# Configure logging (override the level with the LOGLEVEL environment variable)
+logging.basicConfig(
+    level=os.getenv("LOGLEVEL", "WARNING").upper(),
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+async def main():
     # Get API key from environment variable
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -14,21 +23,32 @@ def main():
     print("👋 Hi! I'm your AI assistant. I can help you with calculations, visualizations, text analysis, and more.")
     print("What would you like to explore today? (Type 'quit' to exit)")
     
-    while True:
-        try:
-            user_input = input("\nYou: ").strip()
-            if user_input.lower() == 'quit':
-                print("\nGoodbye! Have a great day! 👋")
-                break
-            if not user_input:
-                continue
+    try:
+        while True:
+            try:
+                user_input = input("\nYou: ").strip()
+                if user_input.lower() == 'quit':
+                    print("\nGoodbye! Have a great day! 👋")
+                    break
+                if not user_input:
+                    continue
                 
-            response = executor.process_user_input(user_input)
-            print("\nAssistant:", response)
+                # Response text is printed as it streams in
+                print("\nAssistant: ", end="", flush=True)
+                await executor.process_user_input(
+                    user_input,
+                    on_token=lambda token: print(token, end="", flush=True)
+                )
+                print()
             
-        except Exception as e:
-            print(f"\nOops! Something went wrong: {str(e)}")
-            print("Let's try something else!")
+            except EOFError:
+                print("\nGoodbye! Have a great day! 👋")
+                break
+            except Exception as e:
+                print(f"\nOops! Something went wrong: {str(e)}")
+                print("Let's try something else!")
+    finally:
+        await executor.aclose()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file
@@ -1,36 +1,63 @@
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from PIL import Image
 import io
 import base64
+import itertools
 import os
-from datetime import datetime
+import threading
+import time
 
 # Create directory for saving images if it doesn't exist
 IMAGES_DIR = "generated_images"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
-def save_base64_image(base64_str: str, prefix: str = "image") -> str:
+# Per-process sequence number that keeps image filenames unique
+_image_counter = itertools.count()
+
+# Shared Agg figure reused by draw_sine_wave; tools may run in worker threads,
+# so drawing on it is serialized with a lock
+_SINE_FIG = Figure(figsize=(10, 6))
+_SINE_CANVAS = FigureCanvasAgg(_SINE_FIG)
+_SINE_AX = _SINE_FIG.add_subplot(111)
+_SINE_LOCK = threading.Lock()
+
+# Functions exposed to the LLM as tools, populated by the @tool decorator
+TOOL_REGISTRY = {}
+
+def tool(func):
+    """
+    Register a function as a tool available to the LLM
+    Args:
+        func: Function to register
+    Returns:
+        The same function, unchanged
+    """
+    TOOL_REGISTRY[func.__name__] = func
+    return func
+
+def save_png_bytes(raw: bytes, prefix: str = "image") -> str:
     """
-    Save a base64 encoded image to file
+    Save raw PNG bytes to file
     Args:
-        base64_str: Base64 encoded image string
+        raw: Encoded PNG image bytes
         prefix: Prefix for the filename (default: 'image')
     Returns:
         str: Path to the saved image file
     """
-    # Generate unique filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{prefix}_{timestamp}.png"
+    # Generate unique filename from a sequence number and nanosecond timestamp
+    filename = f"{prefix}_{next(_image_counter)}_{time.time_ns()}.png"
     filepath = os.path.join(IMAGES_DIR, filename)
     
-    # Decode and save image
-    img_data = base64.b64decode(base64_str)
+    # Write image bytes directly
     with open(filepath, 'wb') as f:
-        f.write(img_data)
+        f.write(raw)
     
     return filepath
 
+@tool
 def calculate_average(*numbers):
     """
     Calculate the average of given numbers
@@ -41,6 +68,7 @@ def calculate_average(*numbers):
     """
     return sum(numbers) / len(numbers)
 
+@tool
 def draw_sine_wave(amplitude=1.0, frequency=1.0) -> dict:
     """
     Draw a sine wave with given parameters
@@ -53,29 +81,27 @@ def draw_sine_wave(amplitude=1.0, frequency=1.0) -> dict:
     x = np.linspace(0, 10, 1000)
     y = amplitude * np.sin(2 * np.pi * frequency * x)
     
-    plt.figure(figsize=(10, 6))
-    plt.plot(x, y)
-    plt.title(f'Sine Wave (Amplitude: {amplitude}, Frequency: {frequency})')
-    plt.grid(True)
-    
-    # Save plot to bytes buffer
+    # Redraw on the shared figure and save plot to bytes buffer
     buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
+    with _SINE_LOCK:
+        _SINE_AX.clear()
+        _SINE_AX.plot(x, y)
+        _SINE_AX.set_title(f'Sine Wave (Amplitude: {amplitude}, Frequency: {frequency})')
+        _SINE_AX.grid(True)
+        _SINE_FIG.savefig(buf, format='png')
+    raw = buf.getvalue()
     
-    # Convert to base64
-    base64_str = base64.b64encode(buf.getvalue()).decode('utf-8')
-    
-    # Save to file
-    filepath = save_base64_image(base64_str, "sine_wave")
+    # Save to file and convert to base64
+    filepath = save_png_bytes(raw, "sine_wave")
+    base64_str = base64.b64encode(raw).decode('utf-8')
     
     return {
         "base64_image": base64_str,
         "saved_path": filepath
     }
 
-def generate_color_gradient(start_color, end_color, width=300, height=100) -> dict:
+@tool
+def generate_color_gradient(start_color, end_color, width=300, height=100, return_base64=False) -> dict:
     """
     Generate an image with a color gradient
     Args:
@@ -83,34 +109,35 @@ def generate_color_gradient(start_color, end_color, width=300, height=100) -> di
         end_color: Tuple of RGB values for end color
         width: Width of the image
         height: Height of the image
+        return_base64: Whether to include the base64 image string in the result (default: False)
     Returns:
-        dict: Dictionary containing base64 image string and saved file path
-    """
-    image = Image.new('RGB', (width, height))
-    pixels = image.load()
+        dict: Dictionary containing saved file path, plus base64 image string if requested
+    """
+    # Interpolate a single row of colors, then repeat it for every line
+    x = np.arange(width)[None, :, None]
+    start = np.array(start_color[:3], dtype=np.float64)
+    end = np.array(end_color[:3], dtype=np.float64)
+    # Clamp to the valid channel range before the cast, which would otherwise wrap around
+    row = np.clip(start + (end - start) * x / width, 0, 255).astype(np.uint8)
+    pixels = np.broadcast_to(row, (height, width, 3)).copy()
+    image = Image.fromarray(pixels, 'RGB')
     
-    for x in range(width):
-        r = int(start_color[0] + (end_color[0] - start_color[0]) * x / width)
-        g = int(start_color[1] + (end_color[1] - start_color[1]) * x / width)
-        b = int(start_color[2] + (end_color[2] - start_color[2]) * x / width)
-        
-        for y in range(height):
-            pixels[x, y] = (r, g, b)
-    
-    # Convert to base64
+    # Encode as PNG; gradients compress well even at the fastest zlib level
     buf = io.BytesIO()
-    image.save(buf, format='PNG')
-    buf.seek(0)
-    base64_str = base64.b64encode(buf.getvalue()).decode('utf-8')
+    image.save(buf, format='PNG', compress_level=1)
+    raw = buf.getvalue()
     
     # Save to file
-    filepath = save_base64_image(base64_str, "gradient")
+    filepath = save_png_bytes(raw, "gradient")
+    result = {"saved_path": filepath}
     
-    return {
-        "base64_image": base64_str,
-        "saved_path": filepath
-    }
+    # Convert to base64 only when asked for
+    if return_base64:
+        result["base64_image"] = base64.b64encode(raw).decode('utf-8')
+    
+    return result
 
+@tool
 def list_generated_images() -> list:
     """
     List all generated images in the images directory
@@ -119,8 +146,10 @@ def list_generated_images() -> list:
     """
     if not os.path.exists(IMAGES_DIR):
         return []
-    return [os.path.join(IMAGES_DIR, f) for f in os.listdir(IMAGES_DIR) if f.endswith(('.png', '.jpg', '.jpeg'))]
+    with os.scandir(IMAGES_DIR) as entries:
+        return [e.path for e in entries if e.is_file() and e.name.endswith(IMAGE_EXTENSIONS)]
 
+@tool
 def clear_generated_images() -> int:
     """
     Delete all generated images
@@ -131,12 +160,14 @@ def clear_generated_images() -> int:
         return 0
     
     count = 0
-    for file in os.listdir(IMAGES_DIR):
-        if file.endswith(('.png', '.jpg', '.jpeg')):
-            os.remove(os.path.join(IMAGES_DIR, file))
-            count += 1
+    with os.scandir(IMAGES_DIR) as entries:
+        for e in entries:
+            if e.is_file() and e.name.endswith(IMAGE_EXTENSIONS):
+                os.unlink(e.path)
+                count += 1
     return count
 
+@tool
 def fibonacci(n):
     """
     Generate Fibonacci sequence up to n numbers
@@ -145,16 +176,20 @@ def fibonacci(n):
     Returns:
         list: List of Fibonacci numbers
     """
+    # The model may send a float such as 5.0
+    n = int(n)
     if n <= 0:
         return []
-    elif n == 1:
-        return [0]
     
-    sequence = [0, 1]
-    while len(sequence) < n:
-        sequence.append(sequence[-1] + sequence[-2])
+    # Preallocate and advance with a tuple swap instead of indexing the list
+    sequence = [0] * n
+    a, b = 0, 1
+    for i in range(1, n):
+        sequence[i] = b
+        a, b = b, a + b
     return sequence
 
+@tool
 def text_statistics(text):
     """
     Analyze text and return various statistics
@@ -167,6 +202,6 @@ def text_statistics(text):
     return {
         'word_count': len(words),
         'char_count': len(text),
-        'avg_word_length': sum(len(word) for word in words) / len(words) if words else 0,
+        'avg_word_length': sum(map(len, words)) / len(words) if words else 0,
         'sentence_count': text.count('.') + text.count('!') + text.count('?')
     } 
\ No newline at end of file